@@ -0,0 +1,289 @@
+import argparse
+import heapq
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+import paho.mqtt.client as mqtt
+
+from broker_local import BrokerLocal
+
+# Reaproveita a decodificacao do monitor (interface-pc/mensagem.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "interface-pc"))
+from mensagem import decodificar_mensagem, formatar_campos  # noqa: E402
+
+# ================= CONFIG PADRAO =================
+# Broker local em processo; MQTT_BROKER/MQTT_PORT (os mesmos da estacao) so
+# valem com --externo, para nao tentar subir o broker local num host remoto.
+BROKER_LOCAL = "127.0.0.1"
+PORTA_LOCAL = 1883
+MQTT_TOPIC = os.environ.get("MQTT_TOPIC", "raspberrypi/estacao")
+
+
+# ================= ESTACOES SIMULADAS =================
+def payload_simulado(estacao, seq):
+    """Mesmo formato publicado por raspberry-pi/app.py, mais campos de controle."""
+    return json.dumps({
+        "timestamp": datetime.now().isoformat(),
+        "temp_c": round(random.uniform(15, 30), 1),
+        "umid_pct": round(random.uniform(40, 90), 1),
+        "press_hpa": round(random.uniform(920, 930), 2),
+        "press_sl_hpa": round(random.uniform(1010, 1020), 2),
+        "temp_bmp_c": round(random.uniform(15, 30), 1),
+        "api_temp_c": None,
+        "api_umid_pct": None,
+        "api_press_hpa": None,
+        "api_press_sl_hpa": None,
+        # controle do teste de carga
+        "estacao": estacao,
+        "seq": seq,
+        "t_envio": time.time(),
+    })
+
+
+def conectar(host, porta, client_id):
+    """Inicia a conexao; o evento devolvido marca o CONNACK aceito."""
+    conectado = threading.Event()
+    c = mqtt.Client(client_id=client_id)
+    c.on_connect = lambda client, userdata, flags, rc: conectado.set() if rc == 0 else None
+    c.connect(host, porta, 60)
+    c.loop_start()
+    return c, conectado
+
+
+def encerrar(clientes):
+    for c in clientes:
+        c.disconnect()
+        c.loop_stop()
+
+
+def rodar_estacoes(clientes, topico, taxa_hz, duracao_s, qos, enviadas, falhas):
+    """Agenda as publicacoes de todas as estacoes numa unica thread (heap por horario).
+
+    publish() com erro conta em falhas (nao saiu desta maquina), nao como perda.
+    """
+    periodo = 1.0 / taxa_hz
+    # Espalha as estacoes dentro do primeiro periodo para nao publicarem em rajada
+    defasagem = [periodo * i / len(clientes) for i in range(len(clientes))]
+    agenda = [(defasagem[i], i) for i in range(len(clientes))]
+    heapq.heapify(agenda)
+    inicio = time.perf_counter()
+    while agenda:
+        quando, i = heapq.heappop(agenda)
+        # tolerancia para erro de arredondamento em defasagem + n * periodo
+        if quando >= duracao_s - 1e-9:
+            continue
+        atraso = inicio + quando - time.perf_counter()
+        if atraso > 0:
+            time.sleep(atraso)
+        n = enviadas[i] + falhas[i]
+        info = clientes[i].publish(topico, payload_simulado(i, n), qos=qos)
+        if info.rc == mqtt.MQTT_ERR_SUCCESS:
+            enviadas[i] += 1
+        else:
+            falhas[i] += 1
+        heapq.heappush(agenda, (defasagem[i] + (n + 1) * periodo, i))
+
+
+# ================= CONSUMIDOR (MONITOR SEM GUI) =================
+class Consumidor:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencias = []
+        self.recebidas = {}
+        self.fora_de_ordem = 0
+        self.erros = 0
+        self.t_primeira = None
+        self.t_ultima = None
+        self._ultimo_seq = {}
+        self.inscrito = threading.Event()
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            client.subscribe(userdata)
+
+    def on_subscribe(self, client, userdata, mid, granted_qos):
+        self.inscrito.set()
+
+    def on_message(self, client, userdata, msg):
+        agora = time.time()
+        try:
+            # Mesmo caminho do on_message do monitor: decodifica e formata
+            dados = decodificar_mensagem(msg.payload)
+            formatar_campos(dados)
+            estacao, seq, t_envio = dados["estacao"], dados["seq"], dados["t_envio"]
+        except Exception:
+            with self.lock:
+                self.erros += 1
+            return
+        with self.lock:
+            self.latencias.append(agora - t_envio)
+            self.recebidas[estacao] = self.recebidas.get(estacao, 0) + 1
+            if seq <= self._ultimo_seq.get(estacao, -1):
+                self.fora_de_ordem += 1
+            self._ultimo_seq[estacao] = seq
+            if self.t_primeira is None:
+                self.t_primeira = agora
+            self.t_ultima = agora
+
+    def total(self):
+        with self.lock:
+            return sum(self.recebidas.values())
+
+
+# ================= RELATORIO =================
+def percentil(ordenados, p):
+    """Percentil por posto mais proximo; lista ja ordenada."""
+    if not ordenados:
+        return None
+    k = max(0, min(len(ordenados) - 1, math.ceil(p / 100.0 * len(ordenados)) - 1))
+    return ordenados[k]
+
+
+def fmt_ms(x):
+    return f"{x * 1000:.2f}" if x is not None else "-"
+
+
+def relatorio(args, enviadas, falhas, consumidor, broker, dur_envio):
+    total_env = sum(enviadas)
+    total_rec = consumidor.total()
+    lat = sorted(consumidor.latencias)
+    janela = (consumidor.t_ultima - consumidor.t_primeira) if total_rec > 1 else 0.0
+    perdidas_por_estacao = {i: enviadas[i] - consumidor.recebidas.get(i, 0) for i in range(len(enviadas))}
+
+    print("=" * 60)
+    print(f"Broker: {args.broker}:{args.porta} ({'local' if broker else 'externo'})  topico: {args.topico}")
+    print(f"Estacoes: {args.estacoes}  taxa: {args.taxa} msg/s por estacao  QoS: {args.qos}")
+    print(f"Duracao envio: {dur_envio:.2f} s")
+    print("-" * 60)
+    # Se a taxa real ficar abaixo do alvo, o gerador (esta maquina) virou o gargalo
+    print(f"Enviadas:     {total_env}  ({total_env / dur_envio:.1f} msg/s, alvo {args.estacoes * args.taxa:.1f})"
+          if dur_envio else f"Enviadas:     {total_env}")
+    print(f"Falhas envio: {sum(falhas)}  (publish com erro no cliente; nao entram nas perdas)")
+    print(f"Recebidas:    {total_rec}  ({total_rec / janela:.1f} msg/s)" if janela else f"Recebidas:    {total_rec}")
+    print(f"Perdidas:     {total_env - total_rec}  ({100.0 * (total_env - total_rec) / total_env:.2f} %)"
+          if total_env else "Perdidas:     0")
+    print(f"Fora de ordem: {consumidor.fora_de_ordem}  erros de decodificacao: {consumidor.erros}")
+    if broker:
+        print(f"Broker: recebidas {broker.recebidas}  repassadas {broker.repassadas}  descartadas {broker.descartadas}")
+    print("-" * 60)
+    print("Latencia fim-a-fim (ms):")
+    print(f"  p50 {fmt_ms(percentil(lat, 50))}  p90 {fmt_ms(percentil(lat, 90))}  "
+          f"p99 {fmt_ms(percentil(lat, 99))}  max {fmt_ms(lat[-1] if lat else None)}")
+    piores = sorted(perdidas_por_estacao.items(), key=lambda kv: kv[1], reverse=True)[:5]
+    if piores and piores[0][1] > 0:
+        print("Estacoes com mais perdas: " + ", ".join(f"#{i}={n}" for i, n in piores if n > 0))
+    print("=" * 60)
+
+
+# ================= MAIN =================
+def positivo(tipo):
+    def conv(texto):
+        v = tipo(texto)
+        if v <= 0:
+            raise argparse.ArgumentTypeError(f"deve ser maior que zero: {texto}")
+        return v
+    return conv
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Teste de carga MQTT: estacoes simuladas -> monitor sem GUI.")
+    ap.add_argument("--estacoes", type=positivo(int), default=10, help="numero de estacoes simuladas")
+    ap.add_argument("--taxa", type=positivo(float), default=1.0, help="mensagens/s por estacao")
+    ap.add_argument("--duracao", type=positivo(float), default=10.0, help="tempo de envio (s)")
+    ap.add_argument("--espera", type=float, default=3.0, help="tempo max. para drenar mensagens apos o envio (s)")
+    ap.add_argument("--espera-conexao", type=positivo(float), default=10.0,
+                    help="tempo max. para todas as estacoes receberem o CONNACK (s)")
+    ap.add_argument("--qos", type=int, default=0, choices=[0, 1])
+    ap.add_argument("--broker", help=f"host do broker (padrao: {BROKER_LOCAL}; com --externo, MQTT_BROKER)")
+    ap.add_argument("--porta", type=int,
+                    help=f"porta do broker (padrao: {PORTA_LOCAL}; com --externo, MQTT_PORT; 0 = livre, so com broker local)")
+    ap.add_argument("--topico", default=MQTT_TOPIC)
+    ap.add_argument("--externo", action="store_true",
+                    help="usa um broker ja em execucao (ex.: mosquitto) em vez do broker local em processo")
+    args = ap.parse_args()
+    if args.externo:
+        args.broker = args.broker or os.environ.get("MQTT_BROKER", BROKER_LOCAL)
+        args.porta = args.porta if args.porta is not None else int(os.environ.get("MQTT_PORT", PORTA_LOCAL))
+    else:
+        args.broker = args.broker or BROKER_LOCAL
+        args.porta = args.porta if args.porta is not None else PORTA_LOCAL
+
+    broker = None
+    if not args.externo:
+        broker = BrokerLocal(args.broker, args.porta).iniciar()
+        args.porta = broker.porta
+
+    consumidor = Consumidor()
+    monitor = mqtt.Client(client_id="bench-monitor", userdata=args.topico)
+    monitor.on_connect = consumidor.on_connect
+    monitor.on_subscribe = consumidor.on_subscribe
+    monitor.on_message = consumidor.on_message
+    try:
+        monitor.connect(args.broker, args.porta, 60)
+    except OSError as e:
+        print(f"Monitor nao conseguiu conectar em {args.broker}:{args.porta}: {e}")
+        if broker:
+            broker.parar()
+        return 1
+    monitor.loop_start()
+    if not consumidor.inscrito.wait(10):
+        print("Monitor nao conseguiu se inscrever no topico.")
+        encerrar([monitor])
+        if broker:
+            broker.parar()
+        return 1
+
+    # Inicia todas as conexoes e so depois espera os CONNACKs (em paralelo)
+    clientes, eventos = [], []
+    try:
+        for i in range(args.estacoes):
+            c, conectado = conectar(args.broker, args.porta, f"bench-estacao-{i}")
+            clientes.append(c)
+            eventos.append(conectado)
+    except OSError as e:
+        print(f"Estacao #{len(clientes)} nao conseguiu conectar em {args.broker}:{args.porta}: {e}")
+        encerrar(clientes + [monitor])
+        if broker:
+            broker.parar()
+        return 1
+    limite = time.perf_counter() + args.espera_conexao
+    falharam = [i for i, ev in enumerate(eventos) if not ev.wait(max(0.0, limite - time.perf_counter()))]
+    if falharam:
+        # Acima de ~1000 sockets o loop do paho (select) deixa de funcionar: o
+        # limite e desta maquina, nao do broker, e a medicao nao valeria
+        print(f"{len(falharam)} de {args.estacoes} estacoes nao conectaram (sem CONNACK em "
+              f"{args.espera_conexao:.0f} s; primeira: #{falharam[0]}). Teste abortado.")
+        encerrar(clientes + [monitor])
+        if broker:
+            broker.parar()
+        return 1
+
+    enviadas = [0] * args.estacoes
+    falhas = [0] * args.estacoes
+
+    t0 = time.perf_counter()
+    rodar_estacoes(clientes, args.topico, args.taxa, args.duracao, args.qos, enviadas, falhas)
+    # A ultima mensagem sai antes do fim da janela; se o gerador atrasou, vale o tempo real
+    dur_envio = max(time.perf_counter() - t0, args.duracao)
+
+    # Drena: espera chegar tudo ou estourar o tempo de espera
+    limite = time.perf_counter() + args.espera
+    while consumidor.total() < sum(enviadas) and time.perf_counter() < limite:
+        time.sleep(0.05)
+
+    encerrar(clientes + [monitor])
+
+    relatorio(args, enviadas, falhas, consumidor, broker, dur_envio)
+    if broker:
+        broker.parar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
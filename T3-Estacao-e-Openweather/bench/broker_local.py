@@ -0,0 +1,183 @@
+import asyncio
+import threading
+
+# ================= BROKER MQTT LOCAL =================
+# Subconjunto do MQTT 3.1.1 suficiente para os testes de carga:
+# CONNECT, PUBLISH (QoS 0/1 na entrada, repasse em QoS 0), SUBSCRIBE,
+# UNSUBSCRIBE, PINGREQ e DISCONNECT. Sem retain, sem sessao persistente.
+
+CONNECT = 1
+PUBLISH = 3
+SUBSCRIBE = 8
+UNSUBSCRIBE = 10
+PINGREQ = 12
+DISCONNECT = 14
+
+# Bytes pendentes por assinante acima dos quais novas mensagens sao descartadas
+LIMITE_BUFFER = 1 << 20
+
+
+def casa_topico(filtro, topico):
+    """Compara topico com filtro MQTT (curingas + e #)."""
+    f = filtro.split("/")
+    t = topico.split("/")
+    for i, nivel in enumerate(f):
+        if nivel == "#":
+            return True
+        if i >= len(t):
+            return False
+        if nivel != "+" and nivel != t[i]:
+            return False
+    return len(f) == len(t)
+
+
+def codificar_comprimento(n):
+    out = bytearray()
+    while True:
+        b = n % 128
+        n //= 128
+        if n:
+            b |= 0x80
+        out.append(b)
+        if not n:
+            return bytes(out)
+
+
+def montar_publish(topico, payload):
+    t = topico.encode()
+    corpo = len(t).to_bytes(2, "big") + t + payload
+    return bytes([PUBLISH << 4]) + codificar_comprimento(len(corpo)) + corpo
+
+
+class BrokerLocal:
+    def __init__(self, host="127.0.0.1", porta=1883, limite_buffer=LIMITE_BUFFER):
+        self.host = host
+        self.porta = porta
+        self.limite_buffer = limite_buffer
+        self.recebidas = 0
+        self.repassadas = 0
+        self.descartadas = 0
+        self._assinantes = {}  # writer -> set de filtros
+        self._conexoes = {}  # tarefa -> writer
+        self._loop = None
+        self._servidor = None
+        self._thread = None
+
+    # ----- ciclo de vida -----
+    def iniciar(self):
+        pronto = threading.Event()
+        erro = []
+
+        def rodar():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._servidor = self._loop.run_until_complete(
+                    asyncio.start_server(self._atender, self.host, self.porta))
+                # porta 0 = escolhida pelo sistema
+                self.porta = self._servidor.sockets[0].getsockname()[1]
+            except Exception as e:
+                erro.append(e)
+                pronto.set()
+                return
+            pronto.set()
+            self._loop.run_forever()
+            self._loop.close()
+
+        self._thread = threading.Thread(target=rodar, name="broker-local", daemon=True)
+        self._thread.start()
+        pronto.wait()
+        if erro:
+            raise erro[0]
+        return self
+
+    def parar(self):
+        if self._loop is None or not self._loop.is_running():
+            return
+        asyncio.run_coroutine_threadsafe(self._encerrar(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    async def _encerrar(self):
+        self._servidor.close()
+        # Fechar o socket faz cada _atender sair pelo fim de leitura
+        for writer in list(self._conexoes.values()):
+            writer.close()
+        await asyncio.gather(*self._conexoes, return_exceptions=True)
+        await self._servidor.wait_closed()
+
+    # ----- protocolo -----
+    async def _ler_comprimento(self, reader):
+        mult, valor = 1, 0
+        while True:
+            b = (await reader.readexactly(1))[0]
+            valor += (b & 0x7F) * mult
+            if not b & 0x80:
+                return valor
+            mult *= 128
+
+    async def _atender(self, reader, writer):
+        tarefa = asyncio.current_task()
+        self._conexoes[tarefa] = writer
+        try:
+            while True:
+                cabecalho = (await reader.readexactly(1))[0]
+                restante = await self._ler_comprimento(reader)
+                corpo = await reader.readexactly(restante) if restante else b""
+                tipo = cabecalho >> 4
+
+                if tipo == CONNECT:
+                    writer.write(b"\x20\x02\x00\x00")  # CONNACK, aceito
+                elif tipo == PUBLISH:
+                    qos = (cabecalho >> 1) & 0x03
+                    n = int.from_bytes(corpo[:2], "big")
+                    topico = corpo[2:2 + n].decode()
+                    pos = 2 + n
+                    if qos:
+                        writer.write(b"\x40\x02" + corpo[pos:pos + 2])  # PUBACK
+                        pos += 2
+                    self._repassar(topico, corpo[pos:])
+                elif tipo == SUBSCRIBE:
+                    filtros = self._ler_filtros(corpo[2:], com_qos=True)
+                    self._assinantes.setdefault(writer, set()).update(filtros)
+                    resp = corpo[:2] + b"\x00" * len(filtros)
+                    writer.write(b"\x90" + codificar_comprimento(len(resp)) + resp)
+                elif tipo == UNSUBSCRIBE:
+                    filtros = self._ler_filtros(corpo[2:], com_qos=False)
+                    self._assinantes.get(writer, set()).difference_update(filtros)
+                    writer.write(b"\xb0\x02" + corpo[:2])
+                elif tipo == PINGREQ:
+                    writer.write(b"\xd0\x00")
+                elif tipo == DISCONNECT:
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._conexoes.pop(tarefa, None)
+            self._assinantes.pop(writer, None)
+            writer.close()
+
+    def _ler_filtros(self, dados, com_qos):
+        filtros = []
+        pos = 0
+        while pos < len(dados):
+            n = int.from_bytes(dados[pos:pos + 2], "big")
+            filtros.append(dados[pos + 2:pos + 2 + n].decode())
+            pos += 2 + n + (1 if com_qos else 0)
+        return filtros
+
+    def _repassar(self, topico, payload):
+        self.recebidas += 1
+        pacote = None
+        for writer, filtros in list(self._assinantes.items()):
+            if not any(casa_topico(f, topico) for f in filtros):
+                continue
+            # Assinante lento: descarta em vez de crescer o buffer sem limite
+            if writer.transport.get_write_buffer_size() > self.limite_buffer:
+                self.descartadas += 1
+                continue
+            if pacote is None:
+                pacote = montar_publish(topico, payload)
+            writer.write(pacote)
+            self.repassadas += 1
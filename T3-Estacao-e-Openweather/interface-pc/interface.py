@@ -1,21 +1,14 @@
-import json
+import os
 import tkinter as tk
 from tkinter import ttk
 import paho.mqtt.client as mqtt
+from mensagem import CAMPOS, decodificar_mensagem, formatar_campos
 
 # ================= CONFIG MQTT =================
-BROKER = "broker.hivemq.com"
-PORT = 1883
-TOPIC = "raspberrypi/estacao"
-
-# ================= FUNÇÃO DE FORMATAÇÃO =================
-def fmt(v):
-            if v is None:
-                return "-"
-            try:
-                return f"{float(v):.1f}"
-            except Exception:
-                return str(v)
+# Pode ser sobrescrito por variaveis de ambiente (ex.: broker local para testes)
+BROKER = os.environ.get("MQTT_BROKER", "broker.hivemq.com")
+PORT = int(os.environ.get("MQTT_PORT", "1883"))
+TOPIC = os.environ.get("MQTT_TOPIC", "raspberrypi/estacao")
 
 # ================= GUI =================
 janela = tk.Tk()
@@ -31,7 +24,7 @@ frame.pack(fill="both", expand=True)
 
 # Campos de exibição
 labels = {}
-for i, campo in enumerate(["Temperatura (°C)", "Umidade (%)", "Pressão (hPa)", "Pressão SL (hPa)", "Horário"]):
+for i, campo in enumerate(CAMPOS):
     ttk.Label(frame, text=campo + ":", font=("Arial", 11)).grid(row=i, column=0, sticky="w", pady=5)
     labels[campo] = ttk.Label(frame, text="---", font=("Arial", 11, "bold"))
     labels[campo].grid(row=i, column=1, sticky="w", padx=10)
@@ -49,13 +42,10 @@ def on_connect(client, userdata, flags, rc):
 
 def on_message(client, userdata, msg):
     try:
-        dados = json.loads(msg.payload.decode())
+        dados = decodificar_mensagem(msg.payload)
 
-        labels["Temperatura (°C)"].config(text=fmt(dados.get("temp_c")))
-        labels["Umidade (%)"].config(text=fmt(dados.get("umid_pct")))
-        labels["Pressão (hPa)"].config(text=fmt(dados.get("press_hpa")))
-        labels["Pressão SL (hPa)"].config(text=fmt(dados.get("press_sl_hpa")))
-        labels["Horário"].config(text=dados.get("timestamp", "-"))
+        for campo, texto in formatar_campos(dados).items():
+            labels[campo].config(text=texto)
 
     except Exception as e:
         status.config(text=f"Erro ao processar JSON: {e}", fg="red")
@@ -0,0 +1,35 @@
+import json
+
+# ================= CAMPOS EXIBIDOS =================
+# Rotulo na tela -> chave no JSON publicado pela estação
+CAMPOS = {
+    "Temperatura (°C)": "temp_c",
+    "Umidade (%)": "umid_pct",
+    "Pressão (hPa)": "press_hpa",
+    "Pressão SL (hPa)": "press_sl_hpa",
+    "Horário": "timestamp",
+}
+
+# ================= FUNÇÃO DE FORMATAÇÃO =================
+def fmt(v):
+    if v is None:
+        return "-"
+    try:
+        return f"{float(v):.1f}"
+    except Exception:
+        return str(v)
+
+# ================= DECODIFICAÇÃO =================
+def decodificar_mensagem(payload):
+    """Converte o payload MQTT (bytes) no dicionário publicado pela estação."""
+    return json.loads(payload.decode())
+
+def formatar_campos(dados):
+    """Texto de cada rótulo da tela a partir do dicionário decodificado."""
+    textos = {}
+    for campo, chave in CAMPOS.items():
+        if chave == "timestamp":
+            textos[campo] = dados.get(chave, "-")
+        else:
+            textos[campo] = fmt(dados.get(chave))
+    return textos
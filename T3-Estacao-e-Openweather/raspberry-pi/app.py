@@ -1,17 +1,16 @@
 import os
 import time
 from datetime import datetime, timezone
-import struct
 import math
-import board
-import adafruit_dht
-from smbus2 import SMBus
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import requests
 import paho.mqtt.client as mqtt
 import json
+from sensores import carregar_registro
+from memoria import (MB, MEM_CACHE_MAX_MB, MEM_FIGS_MAX, MEM_HIST_MAX_MB, CacheLimitado,
+                     MonitorMemoria, bytes_df, fechar_figuras, limitar_historico, rss_bytes)
 
 # ================= CONFIG GERAL =================
 # Coloque sua chave aqui (ou deixe vazio e use a env var OPENWEATHER_API_KEY)
@@ -21,115 +20,48 @@ OPENWEATHER_API_KEY = "f9e5582c8d5c586f5a226916c61195eb"
 if not OPENWEATHER_API_KEY:
     OPENWEATHER_API_KEY = os.environ.get("OPENWEATHER_API_KEY", "")
 
-# DHT22 no GPIO4 (pino fisico 7)
-DHT_PIN = board.D4
-dht = adafruit_dht.DHT22(DHT_PIN, use_pulseio=False)
-
-I2C_BUS = 1
-BMP180_ADDR = 0x77
-BMP180_OSS = 1  # 0..3 (maior = mais lento e mais preciso)
+# Sensores da estacao (tipo, GPIO, barramento I2C...). Sem o arquivo, usa o
+# hardware original: DHT22 no GPIO4 e BMP180 em 0x77 no barramento 1.
+SENSORES_CONFIG = os.environ.get(
+    "SENSORES_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sensores.json"))
 
 # ================= MQTT CONFIG =================
-MQTT_BROKER = "broker.hivemq.com"  # ou o IP do seu servidor MQTT
-MQTT_PORT = 1883
-MQTT_TOPIC = "raspberrypi/estacao"
+# Pode ser sobrescrito por variaveis de ambiente (ex.: broker local para testes)
+MQTT_BROKER = os.environ.get("MQTT_BROKER", "broker.hivemq.com")  # ou o IP do seu servidor MQTT
+MQTT_PORT = int(os.environ.get("MQTT_PORT", "1883"))
+MQTT_TOPIC = os.environ.get("MQTT_TOPIC", "raspberrypi/estacao")
 
 # Se precisar de autenticacao:
-MQTT_USER = ""
-MQTT_PASS = ""
-
-# ================= DRIVER BMP180 =================
-class BMP180:
-    REG_CONTROL = 0xF4
-    REG_RESULT = 0xF6
-    CMD_TEMP = 0x2E
-    CMD_PRESS = 0x34
-
-    def __init__(self, bus, addr=BMP180_ADDR, oss=BMP180_OSS):
-        self.bus = bus
-        self.addr = addr
-        self.oss = oss
-        self._read_calibration()
-
-    def _rS16(self, reg):
-        b = self.bus.read_i2c_block_data(self.addr, reg, 2)
-        return struct.unpack('>h', bytes(b))[0]
-
-    def _rU16(self, reg):
-        b = self.bus.read_i2c_block_data(self.addr, reg, 2)
-        return struct.unpack('>H', bytes(b))[0]
-
-    def _read_calibration(self):
-        self.AC1 = self._rS16(0xAA); self.AC2 = self._rS16(0xAC); self.AC3 = self._rS16(0xAE)
-        self.AC4 = self._rU16(0xB0); self.AC5 = self._rU16(0xB2); self.AC6 = self._rU16(0xB4)
-        self.B1  = self._rS16(0xB6); self.B2  = self._rS16(0xB8)
-        self.MB  = self._rS16(0xBA); self.MC  = self._rS16(0xBC); self.MD  = self._rS16(0xBE)
-
-    def _raw_temp(self):
-        self.bus.write_byte_data(self.addr, self.REG_CONTROL, self.CMD_TEMP)
-        time.sleep(0.005)
-        msb, lsb = self.bus.read_i2c_block_data(self.addr, self.REG_RESULT, 2)
-        return (msb << 8) + lsb
-
-    def _raw_press(self):
-        self.bus.write_byte_data(self.addr, self.REG_CONTROL, self.CMD_PRESS + (self.oss << 6))
-        time.sleep(0.005 + 0.003 * (1 << self.oss))
-        msb, lsb, xlsb = self.bus.read_i2c_block_data(self.addr, self.REG_RESULT, 3)
-        up = ((msb << 16) + (lsb << 8) + xlsb) >> (8 - self.oss)
-        return up
-
-    def read_temperature_pressure(self):
-        ut = self._raw_temp()
-        up = self._raw_press()
-
-        x1 = ((ut - self.AC6) * self.AC5) >> 15
-        x2 = (self.MC << 11) // (x1 + self.MD)
-        b5 = x1 + x2
-        temp_c = ((b5 + 8) >> 4) / 10.0
-
-        b6 = b5 - 4000
-        x1 = (self.B2 * (b6 * b6 >> 12)) >> 11
-        x2 = (self.AC2 * b6) >> 11
-        x3 = x1 + x2
-        b3 = (((self.AC1 * 4 + x3) << self.oss) + 2) >> 2
-
-        x1 = (self.AC3 * b6) >> 13
-        x2 = (self.B1 * (b6 * b6 >> 12)) >> 16
-        x3 = ((x1 + x2) + 2) >> 2
-        b4 = (self.AC4 * (x3 + 32768)) >> 15
-        b7 = (up - b3) * (50000 >> self.oss)
-
-        if b7 < 0x80000000:
-            p = (b7 * 2) // b4
-        else:
-            p = (b7 // b4) * 2
-
-        x1 = (p >> 8) * (p >> 8)
-        x1 = (x1 * 3038) >> 16
-        x2 = (-7357 * p) >> 16
-        press_pa = p + ((x1 + x2 + 3791) >> 4)
-
-        return temp_c, press_pa  # C, Pa
-        
-# ================= LEITURA DHT ROBUSTA =================
-def ler_dht22(max_tentativas=8, pausa=1.0, min_ok=2):
-    vals = []
-    for _ in range(max_tentativas):
-        try:
-            t = dht.temperature
-            h = dht.humidity
-            if t is not None and h is not None:
-                vals.append((h, t))
-                if len(vals) >= min_ok:
-                    break
-        except RuntimeError:
-            pass
-        time.sleep(pausa)
-    if not vals:
-        return None, None
-    umid = sum(v[0] for v in vals) / len(vals)
-    temp = sum(v[1] for v in vals) / len(vals)
-    return umid, temp
+MQTT_USER = os.environ.get("MQTT_USER", "")
+MQTT_PASS = os.environ.get("MQTT_PASS", "")
+
+# ================= RECURSOS COMPARTILHADOS =================
+# O Streamlit reexecuta o script a cada interacao; sensores, cliente MQTT,
+# monitor de memoria e cache sao criados uma unica vez por processo.
+@st.cache_resource(show_spinner=False)
+def iniciar_sensores():
+    return carregar_registro(SENSORES_CONFIG)
+
+@st.cache_resource(show_spinner=False)
+def iniciar_mqtt():
+    client = mqtt.Client()
+    if MQTT_USER:
+        client.username_pw_set(MQTT_USER, MQTT_PASS)
+    # connect_async + loop_start: o cliente fica em cache, entao a conexao (e as
+    # reconexoes, ex. Pi que liga antes da rede) ficam por conta da thread do paho
+    client.on_connect = lambda c, u, f, rc: print(
+        f"Conectado ao broker MQTT: {MQTT_BROKER}" if rc == 0 else f"Erro ao conectar MQTT: codigo {rc}")
+    client.connect_async(MQTT_BROKER, MQTT_PORT, 60)
+    client.loop_start()
+    return client
+
+@st.cache_resource(show_spinner=False)
+def iniciar_monitor_memoria():
+    return MonitorMemoria()
+
+@st.cache_resource(show_spinner=False)
+def iniciar_cache_render():
+    return CacheLimitado(int(MEM_CACHE_MAX_MB * MB))
 
 # ================= PRESSAO NIVEL DO MAR =================
 def pressao_nivel_mar(p_hpa, temp_c, alt_m):
@@ -164,59 +96,41 @@ def fetch_openweather(lat, lon, api_key, timeout=5):
     }
 
 # ================= FUNCOES DE LEITURA =================
-bus = SMBus(I2C_BUS)
-bmp = BMP180(bus)
-
-mqtt_client = mqtt.Client()
-if MQTT_USER:
-    mqtt_client.username_pw_set(MQTT_USER, MQTT_PASS)
-try:
-    mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
-    mqtt_client.loop_start()
-    print(f"Conectado ao broker MQTT: {MQTT_BROKER}")
-except Exception as e:
-    print(f"Erro ao conectar MQTT: {e}")
+registro = iniciar_sensores()
+mqtt_client = iniciar_mqtt()
+monitor_mem = iniciar_monitor_memoria()
+cache_render = iniciar_cache_render()
 
 def ler_sensores(altitude_m):
-    umid, temp_c_dht = ler_dht22()
-    try:
-        temp_c_bmp, press_pa = bmp.read_temperature_pressure()
-        press_hpa = press_pa / 100.0
-    except Exception:
-        temp_c_bmp = None
-        press_hpa = None
-
-    temp_para_sl = temp_c_bmp if temp_c_bmp is not None else temp_c_dht
-    press_sl_hpa = pressao_nivel_mar(press_hpa, temp_para_sl, altitude_m)
-
-    return {
-        "timestamp": datetime.now(),
-        "temp_c": temp_c_dht,
-        "umid_pct": umid,
-        "press_hpa": press_hpa,
-        "press_sl_hpa": press_sl_hpa,
-        "temp_bmp_c": temp_c_bmp,
-    }
+    """Uma leitura de cada sensor do registro (em paralelo), todas com o mesmo horario."""
+    agora = datetime.now()
+    leituras = registro.ler_todos()
+    for leitura in leituras:
+        leitura["timestamp"] = agora
+        if leitura["tipo"] == "bmp180":
+            leitura["press_sl_hpa"] = pressao_nivel_mar(leitura["press_hpa"], leitura["temp_bmp_c"], altitude_m)
+    return leituras
 
 def ler_com_api(altitude_m, lat, lon):
-    base = ler_sensores(altitude_m)
+    leituras = ler_sensores(altitude_m)
     try:
         api = fetch_openweather(lat, lon, OPENWEATHER_API_KEY)
-        base.update(api)
     except Exception as e:
         # Mantem campos de API como None para nao quebrar graficos
         st.error(f"Erro ao consultar OpenWeather: {e}")
-        base.update({
+        api = {
             "api_temp_c": None, "api_umid_pct": None,
             "api_press_hpa": None, "api_press_sl_hpa": None,
             "api_provider": "OpenWeather"
-        })
-    return base
+        }
+    for leitura in leituras:
+        leitura.update(api)
+    return leituras
 
 def media_de_medicoes(medicoes):
     if not medicoes:
         return None
-    chaves = ["temp_c","umid_pct","press_hpa","press_sl_hpa","temp_bmp_c",
+    chaves = ["temp_c","umid_pct","press_hpa","press_sl_hpa","temp_bmp_c","leitura_ms",
               "api_temp_c","api_umid_pct","api_press_hpa","api_press_sl_hpa","api_provider"]
     soma = {k: 0.0 for k in chaves if k != "api_provider"}
     cont = {k: 0 for k in chaves if k != "api_provider"}
@@ -229,13 +143,96 @@ def media_de_medicoes(medicoes):
                 soma[k] += v
                 cont[k] += 1
     res = {k: (soma[k]/cont[k] if cont[k] > 0 else None) for k in soma}
+    # Oversampling nao e media: configuracao da ultima amostra e tempo total de conversao
+    bmp = [d for d in medicoes if d.get("oss") is not None]
+    res["oss"] = bmp[-1]["oss"] if bmp else None
+    res["media_sw"] = bmp[-1]["media_sw"] if bmp else None
+    res["conversao_ms"] = sum(d["conversao_ms"] for d in bmp) if bmp else None
     res["timestamp"] = datetime.now()
     res["api_provider"] = prov
     return res
 
+def media_por_sensor(amostras):
+    """Media de N amostras sensor a sensor (cada amostra = lista de leituras na ordem do registro)."""
+    agora = datetime.now()
+    res = []
+    for grupo in zip(*amostras):
+        m = media_de_medicoes(list(grupo))
+        m.update({"timestamp": agora, "sensor": grupo[0]["sensor"], "tipo": grupo[0]["tipo"]})
+        res.append(m)
+    return res
+
+def resumo_estacao(leituras):
+    """Formato antigo (um DHT22 + um BMP180): primeiro sensor de cada tipo do registro."""
+    dht = next((l for l in leituras if l.get("tipo") == "dht22"), {})
+    bmp = next((l for l in leituras if l.get("tipo") == "bmp180"), {})
+    res = {
+        "timestamp": leituras[0]["timestamp"],
+        "temp_c": dht.get("temp_c"),
+        "umid_pct": dht.get("umid_pct"),
+        "press_hpa": bmp.get("press_hpa"),
+        "press_sl_hpa": bmp.get("press_sl_hpa"),
+        "temp_bmp_c": bmp.get("temp_bmp_c"),
+        "oss": bmp.get("oss"),
+        "media_sw": bmp.get("media_sw"),
+        "conversao_ms": bmp.get("conversao_ms"),
+    }
+    for k in ["api_temp_c","api_umid_pct","api_press_hpa","api_press_sl_hpa","api_provider"]:
+        res[k] = leituras[0].get(k)
+    return res
+
+CAMPOS_MQTT = ["temp_c","umid_pct","press_hpa","press_sl_hpa","temp_bmp_c",
+               "api_temp_c","api_umid_pct","api_press_hpa","api_press_sl_hpa",
+               "sensor","tipo","leitura_ms","oss","media_sw","conversao_ms"]
+
+def payload_mqtt(dados):
+    payload = {"timestamp": dados["timestamp"].isoformat()}
+    payload.update({k: dados[k] for k in CAMPOS_MQTT if k in dados})
+    return json.dumps(payload)
+
 def fmt_val(x):
     return f"{x:.1f}" if (x is not None and not (isinstance(x, float) and math.isnan(x))) else "-"
 
+# ================= HISTORICO =================
+# Colunas numericas em float64: com dtype object cada valor vira um objeto Python
+TIPOS_HIST = {
+    "timestamp": "datetime64[ns]",
+    "temp_c": "float64", "umid_pct": "float64", "press_hpa": "float64",
+    "press_sl_hpa": "float64", "temp_bmp_c": "float64",
+    "api_temp_c": "float64", "api_umid_pct": "float64",
+    "api_press_hpa": "float64", "api_press_sl_hpa": "float64",
+    "api_provider": "object",
+    "sensor": "object", "tipo": "object", "leitura_ms": "float64",
+    "oss": "float64", "media_sw": "float64", "conversao_ms": "float64",
+}
+
+def historico_vazio():
+    return pd.DataFrame({k: pd.Series(dtype=v) for k, v in TIPOS_HIST.items()})
+
+def linhas_historico(leituras):
+    df = pd.DataFrame(leituras)
+    return df.astype({k: v for k, v in TIPOS_HIST.items() if k in df.columns})
+
+# ================= RENDERIZACAO =================
+def mostrar_figura(fig):
+    # clear_figure so limpa os eixos; sem fechar, o pyplot guarda a figura para sempre
+    st.pyplot(fig, clear_figure=True)
+    plt.close(fig)
+
+def plotar_por_sensor(ax, df, coluna, rotulo):
+    # Uma linha por sensor: misturados, os NaN de um tipo quebrariam a linha do outro
+    for sid, g in df.groupby("sensor", sort=False):
+        if coluna in g.columns and g[coluna].notna().any():
+            ax.plot(g["timestamp"], g[coluna], label=f"{rotulo} [{sid}]")
+
+def tabela_e_csv(tail):
+    """Texto e CSV da tabela, reaproveitados entre reruns enquanto o historico nao mudar."""
+    chave = (len(tail), tail["timestamp"].iloc[0], tail["timestamp"].iloc[-1], tuple(tail.columns))
+    res = cache_render.get(chave)
+    if res is None:
+        res = cache_render.put(chave, (tail.to_string(index=False), tail.to_csv(index=False).encode("utf-8")))
+    return res
+
 # ================= UI =================
 st.set_page_config(page_title="Estacao Pi: DHT22 + BMP180 + OpenWeather", layout="wide")
 st.title("Estacao Raspberry Pi (DHT22 + BMP180) + Comparativo OpenWeather")
@@ -253,6 +250,24 @@ with st.sidebar:
     else:
         n_amostras = 1
         pausa_amostras = 0.0
+    st.caption("Sensores: " + ", ".join(f"{s.id} ({s.tipo})" for s in registro.sensores))
+    if sum(getattr(s, "sequencial", False) for s in registro.sensores) > 1:
+        st.caption("DHT22 sem pulseio sao lidos um de cada vez (bit-banging); os demais sensores, em paralelo.")
+
+    st.subheader("BMP180")
+    modos_oss = {"Fixo (config)": "fixo", "Latencia": "latencia",
+                 "Adaptativo": "adaptativo", "Precisao": "precisao"}
+    modo_oss = st.select_slider("Latencia x precisao", options=list(modos_oss), value="Adaptativo",
+                                help="Fixo usa o OSS do arquivo de sensores. Adaptativo le rapido "
+                                     "quando a pressao muda depressa e com mais resolucao quando estavel.")
+    taxa_bmp = st.number_input("Taxa desejada (leituras/s)", min_value=1.0, max_value=100.0,
+                               value=10.0, step=1.0,
+                               help="Tempo maximo de conversao: o menor entre 1/taxa e o tempo "
+                                    "dos outros sensores, lidos em paralelo.")
+    registro.configurar_oversampling(modos_oss[modo_oss], float(taxa_bmp))
+    orcamento_bmp = registro.orcamento_bmp_s()
+    st.caption("Conversao max. por leitura: " +
+               (f"{orcamento_bmp * 1000:.0f} ms" if orcamento_bmp else "sem limite"))
 
     st.subheader("OpenWeather")
     # Mostra o status da chave sem expor a chave:
@@ -261,53 +276,44 @@ with st.sidebar:
     lon = st.number_input("Longitude", value=-46.633000, format="%.6f")
 
     limite = st.number_input("Historico max. (amostras)", min_value=10, max_value=5000, value=500, step=10)
+    limite_mb = st.number_input("Historico max. (MB)", min_value=0.5, max_value=256.0,
+                                value=MEM_HIST_MAX_MB, step=0.5)
     if st.button("Limpar historico"):
-        st.session_state.historico = pd.DataFrame(columns=[
-            "timestamp","temp_c","umid_pct","press_hpa","press_sl_hpa","temp_bmp_c",
-            "api_temp_c","api_umid_pct","api_press_hpa","api_press_sl_hpa","api_provider"
-        ])
+        st.session_state.historico = historico_vazio()
 
 if "historico" not in st.session_state:
-    st.session_state.historico = pd.DataFrame(columns=[
-        "timestamp","temp_c","umid_pct","press_hpa","press_sl_hpa","temp_bmp_c",
-        "api_temp_c","api_umid_pct","api_press_hpa","api_press_sl_hpa","api_provider"
-    ])
+    st.session_state.historico = historico_vazio()
 
 # Botao principal
 if st.button("Ler agora"):
-    medicoes = []
+    amostras = []
     for i in range(int(n_amostras)):
-        medicoes.append(ler_com_api(altitude_m, lat, lon))
+        amostras.append(ler_com_api(altitude_m, lat, lon))
         if i < int(n_amostras) - 1:
             time.sleep(float(pausa_amostras))
-    dados = media_de_medicoes(medicoes) if int(n_amostras) > 1 else medicoes[0]
-    # Publicar no MQTT
+    leituras = media_por_sensor(amostras) if int(n_amostras) > 1 else amostras[0]
+    # Publicar no MQTT: resumo no topico da estacao (monitor) e cada sensor no seu subtopico
     try:
-        payload = {
-            "timestamp": dados["timestamp"].isoformat(),
-            "temp_c": dados["temp_c"],
-            "umid_pct": dados["umid_pct"],
-            "press_hpa": dados["press_hpa"],
-            "press_sl_hpa": dados["press_sl_hpa"],
-            "temp_bmp_c": dados["temp_bmp_c"],
-            "api_temp_c": dados["api_temp_c"],
-            "api_umid_pct": dados["api_umid_pct"],
-            "api_press_hpa": dados["api_press_hpa"],
-            "api_press_sl_hpa": dados["api_press_sl_hpa"],
-        }
-
-        mqtt_client.publish(MQTT_TOPIC, json.dumps(payload))
-        print(f"Publicado no topico MQTT: {MQTT_TOPIC}")
+        mqtt_client.publish(MQTT_TOPIC, payload_mqtt(resumo_estacao(leituras)))
+        for leitura in leituras:
+            mqtt_client.publish(f"{MQTT_TOPIC}/{leitura['sensor']}", payload_mqtt(leitura))
+        print(f"Publicado no topico MQTT: {MQTT_TOPIC} (+{len(leituras)} sensores)")
     except Exception as e:
         print(f"Erro ao publicar MQTT: {e}")
 
-    df = pd.DataFrame([dados])
+    df = linhas_historico(leituras)
     st.session_state.historico = pd.concat([st.session_state.historico, df], ignore_index=True)
-    if len(st.session_state.historico) > limite:
-        st.session_state.historico = st.session_state.historico.iloc[-limite:]
 
+# Aplica os limites a cada rerun (tambem quando o usuario reduz o orcamento).
+# Cada amostra tem uma linha por sensor.
+st.session_state.historico = limitar_historico(
+    st.session_state.historico, int(limite) * len(registro.sensores), int(limite_mb * MB))
 hist = st.session_state.historico
-ultima = hist.iloc[-1] if not hist.empty else None
+if not hist.empty:
+    ultimas = hist[hist["timestamp"] == hist["timestamp"].iloc[-1]]
+    ultima = resumo_estacao(ultimas.to_dict("records"))
+else:
+    ultima = None
 
 # ----- Metricas -----
 c1, c2, c3, c4 = st.columns(4)
@@ -316,57 +322,61 @@ if ultima is not None:
     c2.metric("Umidade (%)", fmt_val(ultima["umid_pct"]))
     c3.metric("Pressao (hPa)", fmt_val(ultima["press_hpa"]))
     c4.metric("Pressao SL (hPa)", fmt_val(ultima["press_sl_hpa"]))
-    st.caption(f"Ultima leitura: {ultima['timestamp']} | OpenWeather")
+    if ultima["oss"] is not None and not math.isnan(ultima["oss"]):
+        st.caption(f"Ultima leitura: {ultima['timestamp']} | OpenWeather | BMP180: OSS {ultima['oss']:.0f}, "
+                   f"media {ultima['media_sw']:.0f}x, conversao {ultima['conversao_ms']:.1f} ms")
+    else:
+        st.caption(f"Ultima leitura: {ultima['timestamp']} | OpenWeather")
 
 st.divider()
-aba1, aba2, aba3 = st.tabs(["Graficos", "Erros (Sensor - API)", "Dados"])
+aba1, aba2, aba3, aba4 = st.tabs(["Graficos", "Erros (Sensor - API)", "Dados", "Memoria"])
 
 with aba1:
     if not hist.empty:
-        df = hist.set_index("timestamp")
+        # API: um valor por amostra (repetido nas linhas de cada sensor)
+        df = hist.drop_duplicates("timestamp").set_index("timestamp")
 
         # --- Temperatura ---
         fig1, ax1 = plt.subplots()
-        if "temp_c" in df.columns:
-            ax1.plot(df.index, df["temp_c"], label="Temp DHT22 (C)")
-        if "temp_bmp_c" in df.columns:
-            ax1.plot(df.index, df["temp_bmp_c"], label="Temp BMP180 (C)")
+        plotar_por_sensor(ax1, hist, "temp_c", "Temp (C)")
+        plotar_por_sensor(ax1, hist, "temp_bmp_c", "Temp (C)")
         if "api_temp_c" in df.columns and df["api_temp_c"].notna().any():
             ax1.plot(df.index, df["api_temp_c"], label="Temp OpenWeather (C)")
         ax1.set_xlabel("Tempo"); ax1.set_ylabel("C"); ax1.legend()
-        st.pyplot(fig1, clear_figure=True)
+        mostrar_figura(fig1)
 
         # --- Umidade ---
         fig2, ax2 = plt.subplots()
-        if "umid_pct" in df.columns:
-            ax2.plot(df.index, df["umid_pct"], label="Umidade Sensor (%)")
+        plotar_por_sensor(ax2, hist, "umid_pct", "Umidade (%)")
         if "api_umid_pct" in df.columns and df["api_umid_pct"].notna().any():
             ax2.plot(df.index, df["api_umid_pct"], label="Umidade OpenWeather (%)")
         ax2.set_xlabel("Tempo"); ax2.set_ylabel("%"); ax2.legend()
-        st.pyplot(fig2, clear_figure=True)
+        mostrar_figura(fig2)
         
         # --- Pressao (terreno e MSL) ---
         fig3, ax3 = plt.subplots()
-        if "press_hpa" in df.columns:
-            ax3.plot(df.index, df["press_hpa"], label="Pressao Sensor (hPa)")
+        plotar_por_sensor(ax3, hist, "press_hpa", "Pressao (hPa)")
         if "api_press_hpa" in df.columns and df["api_press_hpa"].notna().any():
             ax3.plot(df.index, df["api_press_hpa"], label="Pressao OpenWeather (hPa)")
-        if "press_sl_hpa" in df.columns and df["press_sl_hpa"].notna().any():
-            ax3.plot(df.index, df["press_sl_hpa"], label="Pressao SL Sensor (hPa)")
+        plotar_por_sensor(ax3, hist, "press_sl_hpa", "Pressao SL (hPa)")
         if "api_press_sl_hpa" in df.columns and df["api_press_sl_hpa"].notna().any():
             ax3.plot(df.index, df["api_press_sl_hpa"], label="Pressao SL OpenWeather (hPa)")
         ax3.set_xlabel("Tempo"); ax3.set_ylabel("hPa"); ax3.legend()
-        st.pyplot(fig3, clear_figure=True)
+        mostrar_figura(fig3)
         
 with aba2:
     st.write("Diferenca (Sensor - OpenWeather). Positivo = sensor acima da API.")
     if not hist.empty and hist["api_temp_c"].notna().any():
-        df = hist.tail(200).copy()
-
-        df["dif_temp_C"] = df["temp_c"] - df["api_temp_c"]
-        df["dif_umid_%"] = df["umid_pct"] - df["api_umid_pct"]
-        df["dif_press_hPa"] = df["press_hpa"] - df["api_press_hpa"]
-        df["dif_pressSL_hPa"] = df["press_sl_hpa"] - df["api_press_sl_hpa"]
+        ult = hist.tail(200)
+        # So as colunas de diferenca, sem copiar o historico inteiro
+        df = pd.DataFrame({
+            "timestamp": ult["timestamp"],
+            "sensor": ult["sensor"],
+            "dif_temp_C": ult["temp_c"] - ult["api_temp_c"],
+            "dif_umid_%": ult["umid_pct"] - ult["api_umid_pct"],
+            "dif_press_hPa": ult["press_hpa"] - ult["api_press_hpa"],
+            "dif_pressSL_hPa": ult["press_sl_hpa"] - ult["api_press_sl_hpa"],
+        })
 
         def mae(s):
             s = s.dropna()
@@ -379,26 +389,55 @@ with aba2:
         colD.metric("MAE Pressao SL (hPa)", fmt_val(mae(df["dif_pressSL_hPa"])))
 
         figd1, axd1 = plt.subplots()
-        if df["dif_temp_C"].notna().any(): axd1.plot(df["timestamp"], df["dif_temp_C"], label="Delta Temp (C)")
-        if df["dif_umid_%"].notna().any(): axd1.plot(df["timestamp"], df["dif_umid_%"], label="Delta Umidade (%)")
+        plotar_por_sensor(axd1, df, "dif_temp_C", "Delta Temp (C)")
+        plotar_por_sensor(axd1, df, "dif_umid_%", "Delta Umidade (%)")
         axd1.set_xlabel("Tempo"); axd1.set_ylabel("Diferenca"); axd1.legend()
-        st.pyplot(figd1, clear_figure=True)
+        mostrar_figura(figd1)
 
         figd2, axd2 = plt.subplots()
-        if df["dif_press_hPa"].notna().any(): axd2.plot(df["timestamp"], df["dif_press_hPa"], label="Delta Pressao (hPa)")
-        if df["dif_pressSL_hPa"].notna().any(): axd2.plot(df["timestamp"], df["dif_pressSL_hPa"], label="Delta Pressao SL (hPa)")
+        plotar_por_sensor(axd2, df, "dif_press_hPa", "Delta Pressao (hPa)")
+        plotar_por_sensor(axd2, df, "dif_pressSL_hPa", "Delta Pressao SL (hPa)")
         axd2.set_xlabel("Tempo"); axd2.set_ylabel("Diferenca"); axd2.legend()
-        st.pyplot(figd2, clear_figure=True)
+        mostrar_figura(figd2)
     else:
         st.info("Faca ao menos uma leitura com OpenWeather para calcular as diferencas.")
 
 with aba3:
     if not hist.empty:
-        tail = hist.tail(500).copy()
-        tail["timestamp"] = tail["timestamp"].astype(str)
-        st.code(tail.to_string(index=False))
-        csv = tail.to_csv(index=False).encode("utf-8")
+        texto, csv = tabela_e_csv(hist.tail(500))
+        st.code(texto)
         st.download_button("Baixar CSV", csv, "historico.csv", "text/csv")
     else:
         st.write("Sem dados ainda. Clique em Ler agora para registrar uma amostra.")
 
+with aba4:
+    rss = rss_bytes()
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("RSS do processo (MB)", fmt_val(rss / MB if rss is not None else None))
+    m2.metric("Historico (MB)", f"{bytes_df(hist) / MB:.2f} / {limite_mb:.1f}")
+    m3.metric("Cache tabelas (MB)", f"{cache_render.bytes / MB:.2f} / {MEM_CACHE_MAX_MB:.1f}")
+    m4.metric("Figuras abertas", f"{len(plt.get_fignums())} / {MEM_FIGS_MAX}")
+    st.caption(f"Linhas no historico: {len(hist)} | itens no cache: {len(cache_render)} "
+               f"(despejos: {cache_render.despejos}) | figuras fechadas pelo limite: {monitor_mem.figuras_fechadas}")
+
+    if monitor_mem.amostras:
+        rss_df = pd.DataFrame(list(monitor_mem.amostras), columns=["timestamp", "RSS (MB)"]).set_index("timestamp")
+        st.line_chart(rss_df)  # sem matplotlib: nao cria figura nova
+    st.caption(f"RSS amostrado a cada {monitor_mem.intervalo_s:.0f} s.")
+
+    rastrear = st.checkbox("Rastrear alocacoes (tracemalloc)", value=monitor_mem.rastreando,
+                           help="Aumenta o uso de memoria e de CPU enquanto ligado.")
+    monitor_mem.rastrear(rastrear)
+    if rastrear:
+        atual_mb, pico_mb = monitor_mem.traced_mb()
+        st.write(f"Memoria rastreada: {atual_mb:.2f} MB (pico {pico_mb:.2f} MB)")
+        # O snapshot e uma alocacao grande: so sob demanda, nao a cada rerun
+        if st.button("Atualizar maiores alocadores"):
+            monitor_mem.atualizar_top(10)
+        if monitor_mem.top:
+            st.caption(f"Snapshot de {monitor_mem.top_em:%H:%M:%S}")
+            st.dataframe(pd.DataFrame(monitor_mem.top))
+
+# Rede de seguranca: nenhuma figura sobrevive alem do orcamento
+monitor_mem.figuras_fechadas += fechar_figuras(MEM_FIGS_MAX)
+
@@ -0,0 +1,170 @@
+import os
+import threading
+import tracemalloc
+from collections import OrderedDict, deque
+from datetime import datetime
+
+import matplotlib.pyplot as plt
+
+# ================= ORCAMENTOS DE MEMORIA =================
+# Valores padrao; podem ser sobrescritos por variaveis de ambiente.
+MEM_HIST_MAX_MB = float(os.environ.get("MEM_HIST_MAX_MB", "8"))     # historico por sessao
+MEM_CACHE_MAX_MB = float(os.environ.get("MEM_CACHE_MAX_MB", "4"))   # textos/CSV renderizados
+MEM_FIGS_MAX = int(os.environ.get("MEM_FIGS_MAX", "8"))             # figuras matplotlib abertas
+MEM_AMOSTRA_S = float(os.environ.get("MEM_AMOSTRA_S", "30"))        # intervalo de amostragem do RSS
+MEM_AMOSTRAS_MAX = int(os.environ.get("MEM_AMOSTRAS_MAX", "2880"))  # 24 h a cada 30 s
+MEM_TRACEMALLOC = os.environ.get("MEM_TRACEMALLOC", "") == "1"      # liga o tracemalloc na partida
+
+MB = 1024 * 1024
+
+# ================= RSS DO PROCESSO =================
+def rss_bytes():
+    """RSS atual (Linux, /proc). Fallback: pico do processo via getrusage."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, AttributeError):
+        return None
+
+# ================= HISTORICO =================
+def bytes_df(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+def limitar_historico(df, max_linhas, max_bytes):
+    """Descarta as linhas mais antigas ate caber em max_linhas e max_bytes."""
+    if len(df) > max_linhas:
+        df = df.iloc[-max_linhas:]
+    if df.empty:
+        return df
+    total = bytes_df(df)
+    if total > max_bytes:
+        # Linhas tem tamanho quase constante: corta de uma vez pela media
+        por_linha = total / len(df)
+        manter = max(1, int(max_bytes // por_linha))
+        df = df.iloc[-manter:]
+    return df
+
+# ================= CACHE LIMITADO =================
+class CacheLimitado:
+    """LRU por tamanho em bytes; valores sao bytes/str."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.despejos = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _tamanho(self, valor):
+        if isinstance(valor, (tuple, list)):
+            return sum(self._tamanho(v) for v in valor)
+        return len(valor)
+
+    def get(self, chave):
+        with self._lock:
+            valor = self._itens.get(chave)
+            if valor is not None:
+                self._itens.move_to_end(chave)
+            return valor
+
+    def put(self, chave, valor):
+        tam = self._tamanho(valor)
+        with self._lock:
+            if chave in self._itens:
+                self.bytes -= self._tamanho(self._itens.pop(chave))
+            if tam > self.max_bytes:
+                return valor  # nao cabe nem sozinho: devolve sem guardar
+            self._itens[chave] = valor
+            self.bytes += tam
+            while self.bytes > self.max_bytes:
+                _, antigo = self._itens.popitem(last=False)
+                self.bytes -= self._tamanho(antigo)
+                self.despejos += 1
+        return valor
+
+    def __len__(self):
+        return len(self._itens)
+
+# ================= FIGURAS =================
+def fechar_figuras(max_abertas=MEM_FIGS_MAX):
+    """Fecha as figuras pyplot mais antigas alem do limite; retorna quantas fechou."""
+    nums = plt.get_fignums()
+    excesso = nums[:-max_abertas] if max_abertas > 0 else nums
+    for n in excesso:
+        plt.close(n)
+    return len(excesso)
+
+# ================= MONITOR (RSS + TRACEMALLOC) =================
+class MonitorMemoria:
+    """Amostra o RSS em segundo plano e expoe o tracemalloc para a UI."""
+
+    def __init__(self, intervalo_s=MEM_AMOSTRA_S, max_amostras=MEM_AMOSTRAS_MAX, rastrear=MEM_TRACEMALLOC):
+        self.intervalo_s = intervalo_s
+        self.amostras = deque(maxlen=max_amostras)  # (datetime, rss_mb)
+        self.figuras_fechadas = 0
+        self.top = []        # ultimo resultado de atualizar_top
+        self.top_em = None
+        self.rastrear(rastrear)
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._rodar, name="monitor-memoria", daemon=True)
+        self._thread.start()
+
+    def _rodar(self):
+        while not self._parar.is_set():
+            self.amostrar()
+            self._parar.wait(self.intervalo_s)
+
+    def amostrar(self):
+        rss = rss_bytes()
+        if rss is not None:
+            self.amostras.append((datetime.now(), rss / MB))
+        return rss
+
+    def parar(self):
+        self._parar.set()
+
+    # ----- tracemalloc -----
+    @property
+    def rastreando(self):
+        return tracemalloc.is_tracing()
+
+    def rastrear(self, ligar, quadros=1):
+        if ligar and not tracemalloc.is_tracing():
+            tracemalloc.start(quadros)
+        elif not ligar and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def atualizar_top(self, n=10):
+        """Tira um snapshot e guarda os maiores alocadores para a UI."""
+        self.top = self.top_alocadores(n)
+        self.top_em = datetime.now()
+        return self.top
+
+    def top_alocadores(self, n=10):
+        """Linhas de codigo com mais memoria alocada ainda viva."""
+        if not tracemalloc.is_tracing():
+            return []
+        snap = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        res = []
+        for stat in snap.statistics("lineno")[:n]:
+            quadro = stat.traceback[0]
+            res.append({
+                "arquivo": f"{quadro.filename}:{quadro.lineno}",
+                "tamanho_kb": stat.size / 1024,
+                "blocos": stat.count,
+            })
+        return res
+
+    def traced_mb(self):
+        if not tracemalloc.is_tracing():
+            return None, None
+        atual, pico = tracemalloc.get_traced_memory()
+        return atual / MB, pico / MB
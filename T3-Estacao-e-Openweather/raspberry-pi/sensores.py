@@ -0,0 +1,423 @@
+import json
+import math
+import os
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import board
+import adafruit_dht
+from smbus2 import SMBus
+
+# pulseio (Blinka usa libgpiod no Raspberry Pi) captura os pulsos do DHT22 fora
+# do Python, entao varias leituras podem rodar ao mesmo tempo. Mesmo teste do adafruit_dht.
+try:
+    from pulseio import PulseIn  # noqa: F401
+    DHT_PULSEIO = True
+except (ImportError, NotImplementedError):
+    DHT_PULSEIO = False
+
+# ================= CONFIG PADRAO =================
+# Usada quando nao existe arquivo de configuracao: o hardware original da estacao.
+# DHT22 no GPIO4 (pino fisico 7) e BMP180 em 0x77 no barramento I2C 1.
+BMP180_ADDR = 0x77
+BMP180_OSS = 1  # 0..3 (maior = mais lento e mais preciso)
+
+# Datasheet BMP180: tempo maximo de conversao (s) e ruido RMS tipico (hPa) por OSS
+CONVERSAO_TEMP_S = 0.0045
+CONVERSAO_PRESS_S = {0: 0.0045, 1: 0.0075, 2: 0.0135, 3: 0.0255}
+RUIDO_OSS_HPA = {0: 0.06, 1: 0.05, 2: 0.04, 3: 0.03}
+MAX_MEDIA_SW = 8  # maximo de conversoes de pressao somadas por software
+
+SENSORES_PADRAO = [
+    {"id": "dht22", "tipo": "dht22", "pino": "D4"},
+    {"id": "bmp180", "tipo": "bmp180", "barramento": 1, "endereco": BMP180_ADDR},
+]
+
+# ================= DRIVER BMP180 =================
+class BMP180:
+    REG_CONTROL = 0xF4
+    REG_RESULT = 0xF6
+    CMD_TEMP = 0x2E
+    CMD_PRESS = 0x34
+
+    def __init__(self, bus, addr=BMP180_ADDR, oss=BMP180_OSS):
+        self.bus = bus
+        self.addr = addr
+        self.set_oss(oss)
+        self._read_calibration()
+
+    def set_oss(self, oss):
+        """Troca o oversampling (0..3); vale a partir da proxima conversao."""
+        if oss not in CONVERSAO_PRESS_S:
+            raise ValueError(f"OSS invalido: {oss} (use 0..3)")
+        self.oss = oss
+
+    def _rS16(self, reg):
+        b = self.bus.read_i2c_block_data(self.addr, reg, 2)
+        return struct.unpack('>h', bytes(b))[0]
+
+    def _rU16(self, reg):
+        b = self.bus.read_i2c_block_data(self.addr, reg, 2)
+        return struct.unpack('>H', bytes(b))[0]
+
+    def _read_calibration(self):
+        self.AC1 = self._rS16(0xAA); self.AC2 = self._rS16(0xAC); self.AC3 = self._rS16(0xAE)
+        self.AC4 = self._rU16(0xB0); self.AC5 = self._rU16(0xB2); self.AC6 = self._rU16(0xB4)
+        self.B1  = self._rS16(0xB6); self.B2  = self._rS16(0xB8)
+        self.MB  = self._rS16(0xBA); self.MC  = self._rS16(0xBC); self.MD  = self._rS16(0xBE)
+
+    def _raw_temp(self):
+        self.bus.write_byte_data(self.addr, self.REG_CONTROL, self.CMD_TEMP)
+        time.sleep(CONVERSAO_TEMP_S)
+        msb, lsb = self.bus.read_i2c_block_data(self.addr, self.REG_RESULT, 2)
+        return (msb << 8) + lsb
+
+    def _raw_press(self, oss):
+        self.bus.write_byte_data(self.addr, self.REG_CONTROL, self.CMD_PRESS + (oss << 6))
+        time.sleep(CONVERSAO_PRESS_S[oss])
+        msb, lsb, xlsb = self.bus.read_i2c_block_data(self.addr, self.REG_RESULT, 3)
+        up = ((msb << 16) + (lsb << 8) + xlsb) >> (8 - oss)
+        return up
+
+    def read_temperature_pressure(self, amostras=1):
+        """Temperatura e pressao; com amostras > 1 a pressao e a media de varias
+        conversoes, todas compensadas com a mesma leitura de temperatura."""
+        oss = self.oss
+        ut = self._raw_temp()
+
+        x1 = ((ut - self.AC6) * self.AC5) >> 15
+        x2 = (self.MC << 11) // (x1 + self.MD)
+        b5 = x1 + x2
+        temp_c = ((b5 + 8) >> 4) / 10.0
+
+        soma = 0
+        for _ in range(amostras):
+            soma += self._compensar_pressao(self._raw_press(oss), b5, oss)
+        return temp_c, soma / amostras  # C, Pa
+
+    def _compensar_pressao(self, up, b5, oss):
+        b6 = b5 - 4000
+        x1 = (self.B2 * (b6 * b6 >> 12)) >> 11
+        x2 = (self.AC2 * b6) >> 11
+        x3 = x1 + x2
+        b3 = (((self.AC1 * 4 + x3) << oss) + 2) >> 2
+
+        x1 = (self.AC3 * b6) >> 13
+        x2 = (self.B1 * (b6 * b6 >> 12)) >> 16
+        x3 = ((x1 + x2) + 2) >> 2
+        b4 = (self.AC4 * (x3 + 32768)) >> 15
+        b7 = (up - b3) * (50000 >> oss)
+
+        if b7 < 0x80000000:
+            p = (b7 * 2) // b4
+        else:
+            p = (b7 // b4) * 2
+
+        x1 = (p >> 8) * (p >> 8)
+        x1 = (x1 * 3038) >> 16
+        x2 = (-7357 * p) >> 16
+        return p + ((x1 + x2 + 3791) >> 4)  # Pa
+
+# ================= CONTROLE DE OVERSAMPLING =================
+def tempo_conversao_s(oss, amostras=1):
+    """Orcamento de conversao de uma leitura: 1 temperatura + N pressoes."""
+    return CONVERSAO_TEMP_S + amostras * CONVERSAO_PRESS_S[oss]
+
+def ruido_esperado_hpa(oss, amostras=1):
+    return RUIDO_OSS_HPA[oss] / math.sqrt(amostras)
+
+class ControleOversampling:
+    """Escolhe OSS e media por software para cada leitura do BMP180.
+
+    - fixo: OSS da configuracao, sem media (comportamento original);
+    - latencia: a conversao mais rapida (OSS 0, 1 amostra);
+    - precisao: o menor ruido que cabe no orcamento;
+    - adaptativo: parado, a configuracao mais barata que atinge
+      ruido_alvo_hpa; quando a pressao anda mais que 2x o ruido entre duas
+      leituras, encurta a conversao na mesma proporcao (quanto maior a
+      tendencia, mais curta a conversao).
+
+    orcamento_s e o tempo de conversao disponivel por leitura (None = sem
+    limite); o RegistroSensores o deriva da taxa pedida.
+    """
+
+    MODOS = ("fixo", "latencia", "adaptativo", "precisao")
+    # O ruido observado vem de poucas leituras (janela): abaixo deste fator a
+    # diferenca para o datasheet e incerteza da estimativa, nao ruido real
+    FATOR_RUIDO_MIN = 1.5
+
+    def __init__(self, oss_fixo=BMP180_OSS, modo="adaptativo", orcamento_s=None,
+                 ruido_alvo_hpa=0.02, janela=16):
+        self.oss_fixo = oss_fixo
+        self.ruido_alvo_hpa = ruido_alvo_hpa
+        self.orcamento_s = orcamento_s
+        self.historico = deque(maxlen=janela)  # (t_monotonic, press_hpa, oss, amostras)
+        self.configurar(modo)
+
+    def configurar(self, modo):
+        if modo not in self.MODOS:
+            raise ValueError(f"Modo de oversampling desconhecido: {modo!r}")
+        self.modo = modo
+
+    def registrar(self, press_hpa, oss, amostras, t=None):
+        if press_hpa is not None:
+            self.historico.append((time.monotonic() if t is None else t, press_hpa, oss, amostras))
+
+    def candidatos(self):
+        """(oss, amostras) que cabem no orcamento, do mais rapido ao mais lento."""
+        orcamento = self.orcamento_s if self.orcamento_s else float("inf")
+        res = [(oss, n) for oss in CONVERSAO_PRESS_S for n in range(1, MAX_MEDIA_SW + 1)
+               if tempo_conversao_s(oss, n) <= orcamento]
+        res.sort(key=lambda c: tempo_conversao_s(*c))
+        return res or [(0, 1)]
+
+    def _dinamica(self):
+        """Tendencia (hPa/s), intervalo tipico entre leituras (s) e fator ruido observado / esperado."""
+        if len(self.historico) < 4:
+            return None, None, 1.0
+        t = [h[0] for h in self.historico]
+        p = [h[1] for h in self.historico]
+        # Inclinacao das ultimas leituras pelo tempo entre elas: reage logo no
+        # inicio de uma rampa e nao depende da cadencia das leituras
+        dt = t[-1] - t[-3]
+        tendencia = abs(p[-1] - p[-3]) / dt if dt > 0 else 0.0
+        intervalos = sorted(b - a for a, b in zip(t, t[1:]))
+        intervalo = intervalos[len(intervalos) // 2]
+        # Diferenca segunda cancela a tendencia linear. Cada uma e dividida pelo
+        # seu desvio esperado (as leituras podem ter OSS/media diferentes):
+        # dp(p0 - 2 p1 + p2) = sqrt(s0^2 + 4 s1^2 + s2^2).
+        # Mediana (MAD) em vez de RMS para o joelho de uma rampa nao parecer ruido.
+        s = [ruido_esperado_hpa(oss, n) for _, _, oss, n in self.historico]
+        z = sorted(abs(p[i - 1] - 2 * p[i] + p[i + 1]) /
+                   math.sqrt(s[i - 1] ** 2 + 4 * s[i] ** 2 + s[i + 1] ** 2)
+                   for i in range(1, len(p) - 1))
+        fator = z[len(z) // 2] / 0.6745
+        return tendencia, intervalo, fator if fator >= self.FATOR_RUIDO_MIN else 1.0
+
+    def escolher(self):
+        if self.modo == "fixo":
+            return self.oss_fixo, 1
+        cands = self.candidatos()
+        if self.modo == "latencia":
+            return cands[0]
+        mais_preciso = min(cands, key=lambda c: (ruido_esperado_hpa(*c), tempo_conversao_s(*c)))
+        if self.modo == "precisao":
+            return mais_preciso
+
+        tendencia, intervalo, fator = self._dinamica()
+        if tendencia is None:
+            return mais_preciso
+        estavel = next((c for c in cands if ruido_esperado_hpa(*c) * fator <= self.ruido_alvo_hpa),
+                       mais_preciso)
+        # Quanto a pressao anda entre duas leituras, contra o ruido de uma leitura.
+        # A tendencia vem de p[-1] - p[-3]: com pressao parada, variacao tem
+        # dp = ruido / sqrt(2); o limiar de 2 ruidos fica em ~3 dp.
+        variacao = tendencia * intervalo
+        limiar = 2 * ruido_esperado_hpa(*estavel) * fator
+        if variacao <= limiar:
+            return estavel
+        # O limite so diminui com a tendencia: nunca escolhe conversao mais longa
+        limite = tempo_conversao_s(*estavel) * limiar / variacao
+        rapidos = [c for c in cands if tempo_conversao_s(*c) <= limite]
+        if not rapidos:
+            return cands[0]
+        return min(rapidos, key=lambda c: (ruido_esperado_hpa(*c), tempo_conversao_s(*c)))
+
+# ================= BARRAMENTOS =================
+class BarramentoI2C:
+    """SMBus com trava: cada transacao e atomica entre threads.
+
+    A trava cobre so a transacao, nao o tempo de conversao do sensor,
+    entao dispositivos no mesmo barramento convertem em paralelo.
+    """
+
+    def __init__(self, numero):
+        self.numero = numero
+        self.lock = threading.Lock()
+        self._bus = SMBus(numero)
+
+    def read_i2c_block_data(self, addr, reg, n):
+        with self.lock:
+            return self._bus.read_i2c_block_data(addr, reg, n)
+
+    def write_byte_data(self, addr, reg, valor):
+        with self.lock:
+            return self._bus.write_byte_data(addr, reg, valor)
+
+# DHT22 sem pulseio e lido por bit-banging em Python (~0,35 s por tentativa):
+# duas leituras ao mesmo tempo disputam a CPU e perdem o tempo dos pulsos, entao
+# esses sensores sao lidos um de cada vez. As esperas entre tentativas ficam fora
+# da trava. Com pulseio nao ha trava.
+_LOCK_GPIO = threading.Lock()
+
+# ================= SENSORES =================
+class SensorDHT22:
+    tipo = "dht22"
+
+    def __init__(self, id, pino="D4", pulseio=DHT_PULSEIO, max_tentativas=8, pausa=1.0, min_ok=2):
+        self.id = id
+        self.pino = pino
+        self.max_tentativas = max_tentativas
+        self.pausa = pausa
+        self.min_ok = min_ok
+        self.pulseio = bool(pulseio) and DHT_PULSEIO
+        # Bit-banging divide a trava com os outros DHT22: leitura sequencial
+        self.sequencial = not self.pulseio
+        self._lock = _LOCK_GPIO if self.sequencial else threading.Lock()
+        self.dev = adafruit_dht.DHT22(getattr(board, pino), use_pulseio=self.pulseio)
+
+    def ler(self):
+        """Leitura robusta: varias tentativas, media simples das leituras boas."""
+        vals = []
+        for _ in range(self.max_tentativas):
+            try:
+                with self._lock:
+                    t = self.dev.temperature
+                    h = self.dev.humidity
+                if t is not None and h is not None:
+                    vals.append((h, t))
+                    if len(vals) >= self.min_ok:
+                        break
+            except RuntimeError:
+                pass
+            time.sleep(self.pausa)
+        if not vals:
+            return {"temp_c": None, "umid_pct": None}
+        return {
+            "temp_c": sum(v[1] for v in vals) / len(vals),
+            "umid_pct": sum(v[0] for v in vals) / len(vals),
+        }
+
+class SensorBMP180:
+    tipo = "bmp180"
+
+    def __init__(self, id, barramento, endereco=BMP180_ADDR, oss=BMP180_OSS):
+        self.id = id
+        self.barramento = barramento
+        self.dev = BMP180(barramento, endereco, oss)
+        self.controle = ControleOversampling(oss_fixo=oss)
+        # A trava do barramento cobre so uma transacao; esta cobre comando ->
+        # espera -> resultado (e o controle), pois o registro e compartilhado
+        # entre sessoes do painel
+        self._lock = threading.Lock()
+
+    def ler(self):
+        with self._lock:
+            oss, amostras = self.controle.escolher()
+            info = {"oss": oss, "media_sw": amostras,
+                    "conversao_ms": tempo_conversao_s(oss, amostras) * 1000.0}
+            try:
+                self.dev.set_oss(oss)
+                temp_c, press_pa = self.dev.read_temperature_pressure(amostras)
+            except Exception:
+                return {"temp_bmp_c": None, "press_hpa": None, **info}
+            press_hpa = press_pa / 100.0
+            self.controle.registrar(press_hpa, oss, amostras)
+        return {"temp_bmp_c": temp_c, "press_hpa": press_hpa, **info}
+
+# ================= REGISTRO =================
+def validar_id(sid):
+    """O id vira o ultimo nivel do topico MQTT: sem vazio, curingas ou '/'."""
+    sid = "" if sid is None else str(sid)
+    if not sid.strip() or any(ch in sid for ch in "+#/\0"):
+        raise ValueError(f"Id de sensor invalido: {sid!r} (nao pode ser vazio nem conter '+', '#' ou '/')")
+    return sid
+
+class RegistroSensores:
+    """Instancia os sensores da configuracao e le todos em paralelo."""
+
+    def __init__(self, config):
+        if not config:
+            raise ValueError("Configuracao de sensores vazia: declare ao menos um sensor.")
+        self.barramentos = {}
+        self.sensores = []
+        ids = set()
+        pinos = {}      # pino -> id
+        enderecos = {}  # (barramento, endereco) -> id
+        for c in config:
+            sid = validar_id(c.get("id"))
+            if sid in ids:
+                raise ValueError(f"Sensor com id repetido: {sid}")
+            ids.add(sid)
+            tipo = c.get("tipo", "").lower()
+            if tipo == "dht22":
+                pino = c.get("pino", "D4")
+                if isinstance(pino, int):
+                    pino = f"D{pino}"
+                if pino in pinos:
+                    raise ValueError(f"Pino {pino} usado por '{pinos[pino]}' e '{sid}'.")
+                pinos[pino] = sid
+                self.sensores.append(SensorDHT22(sid, pino, c.get("pulseio", DHT_PULSEIO)))
+            elif tipo == "bmp180":
+                num = int(c.get("barramento", 1))
+                endereco = c.get("endereco", BMP180_ADDR)
+                if isinstance(endereco, str):
+                    endereco = int(endereco, 0)
+                if (num, endereco) in enderecos:
+                    raise ValueError(f"Barramento {num} endereco {endereco:#04x} usado por "
+                                     f"'{enderecos[num, endereco]}' e '{sid}'.")
+                enderecos[num, endereco] = sid
+                if num not in self.barramentos:
+                    self.barramentos[num] = BarramentoI2C(num)
+                self.sensores.append(SensorBMP180(sid, self.barramentos[num], endereco,
+                                                  int(c.get("oss", BMP180_OSS))))
+            else:
+                raise ValueError(f"Tipo de sensor desconhecido em '{sid}': {tipo!r}")
+        self._tipos = {s.id: s.tipo for s in self.sensores}
+        self.ultimo_ms = {}   # sensor -> duracao da ultima leitura
+        self.taxa_hz = None
+        # Uma thread por sensor: o tempo total fica perto do sensor mais lento
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.sensores)),
+                                        thread_name_prefix="sensor")
+
+    def _ler_um(self, sensor):
+        t0 = time.perf_counter()
+        leitura = sensor.ler()
+        leitura.update({
+            "sensor": sensor.id,
+            "tipo": sensor.tipo,
+            "leitura_ms": (time.perf_counter() - t0) * 1000.0,
+        })
+        return leitura
+
+    def configurar_oversampling(self, modo, taxa_hz):
+        """taxa_hz: leituras por segundo pedidas para o BMP180."""
+        self.taxa_hz = taxa_hz
+        for s in self.sensores:
+            if s.tipo == "bmp180":
+                s.controle.configurar(modo)
+
+    def orcamento_bmp_s(self):
+        """Tempo de conversao do BMP180: min(1/taxa, folga da leitura em paralelo).
+
+        A folga e o tempo que os outros sensores levaram na ultima leitura;
+        acima dela, o BMP180 passaria a atrasar a leitura de todos.
+        """
+        limites = [1.0 / self.taxa_hz] if self.taxa_hz else []
+        outros = [ms for sid, ms in self.ultimo_ms.items() if self._tipos[sid] != "bmp180"]
+        if outros:
+            limites.append(max(outros) / 1000.0)
+        return min(limites) if limites else None
+
+    def ler_todos(self):
+        """Lista de leituras (uma por sensor), na ordem da configuracao."""
+        orcamento = self.orcamento_bmp_s()
+        for s in self.sensores:
+            if s.tipo == "bmp180":
+                s.controle.orcamento_s = orcamento
+        leituras = list(self._pool.map(self._ler_um, self.sensores))
+        self.ultimo_ms = {l["sensor"]: l["leitura_ms"] for l in leituras}
+        return leituras
+
+def carregar_registro(caminho):
+    """Le o JSON de sensores; sem arquivo, usa SENSORES_PADRAO."""
+    if caminho and os.path.exists(caminho):
+        with open(caminho) as f:
+            config = json.load(f)
+        config = config.get("sensores", []) if isinstance(config, dict) else config
+    else:
+        config = SENSORES_PADRAO
+    return RegistroSensores(config)